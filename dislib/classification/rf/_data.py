@@ -1,4 +1,8 @@
+import os
+import re
+import struct
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from numpy.lib import format
@@ -7,6 +11,7 @@ from pycompss.api.parameter import FILE_IN, FILE_INOUT, COLLECTION_IN, Depth, \
 from pycompss.api.task import task
 
 from dislib.data.array import Array
+from dislib.utils.base import _paired_partition
 
 
 class RfDataset(object):
@@ -27,8 +32,8 @@ class RfDataset(object):
         self.n_features must be set manually (they can also be
         pycompss.runtime.Future objects).
     labels_path : str
-        Path of the .dat file containing the 1-d array of labels. It can be a
-        pycompss.runtime.Future object.
+        Path of the .npy or .dat file containing the 1-d array of labels. It
+        can be a pycompss.runtime.Future object.
     features_path : str, optional (default=None)
         Path of the .npy file containing the 2-d array of samples transposed.
         The array must be C-ordered. Providing this array may improve the
@@ -180,7 +185,9 @@ def transform_to_rf_dataset(x: Array, y: Array) -> RfDataset:
     """Creates a RfDataset object from samples x and labels y.
 
     This function creates a dislib.classification.rf.data.RfDataset by saving
-    x and y in files.
+    x and y in files. A C-ordered transposed copy of x (the features file) is
+    also saved, so that fit() can stream the features sequentially instead of
+    gathering strided columns from the samples file.
 
     Parameters
     ----------
@@ -202,31 +209,54 @@ def transform_to_rf_dataset(x: Array, y: Array) -> RfDataset:
                                                delete=False)
     samples_path = samples_file.name
     samples_file.close()
-    _allocate_samples_file(samples_path, n_samples, n_features)
-
-    start_idx = 0
-    row_blocks_iterator = x._iterator(axis=0)
-    top_row = next(row_blocks_iterator)
-    _fill_samples_file(samples_path, top_row._blocks, start_idx)
-    start_idx += x._top_left_shape[0]
-    for x_row in row_blocks_iterator:
-        _fill_samples_file(samples_path, x_row._blocks, start_idx)
-        start_idx += x._reg_shape[0]
-
-    labels_file = tempfile.NamedTemporaryFile(mode='w',
+    labels_file = tempfile.NamedTemporaryFile(mode='wb',
                                               prefix='tmp_rf_labels_',
                                               delete=False)
     labels_path = labels_file.name
     labels_file.close()
-    for y_row in y._iterator(axis=0):
-        _fill_labels_file(labels_path, y_row._blocks)
 
-    rf_dataset = RfDataset(samples_path, labels_path)
+    start_idx = 0
+    x_chunk = []
+    y_chunk = []
+    chunk_rows = 0
+    for x_row, y_row in _paired_partition(x, y):
+        x_chunk.append(x_row._blocks)
+        y_chunk.append(y_row._blocks)
+        chunk_rows += x_row.shape[0]
+        if len(x_chunk) == _ROW_BLOCKS_PER_FILL:
+            _fill_dataset_files(samples_path, labels_path, x_chunk, y_chunk,
+                                start_idx, n_samples, n_features)
+            start_idx += chunk_rows
+            x_chunk = []
+            y_chunk = []
+            chunk_rows = 0
+    if x_chunk:
+        _fill_dataset_files(samples_path, labels_path, x_chunk, y_chunk,
+                            start_idx, n_samples, n_features)
+
+    features_file = tempfile.NamedTemporaryFile(mode='wb',
+                                                prefix='tmp_rf_features_',
+                                                delete=False)
+    features_path = features_file.name
+    features_file.close()
+    _build_features_file(samples_path, features_path, n_samples, n_features)
+
+    rf_dataset = RfDataset(samples_path, labels_path, features_path)
     rf_dataset.n_samples = n_samples
     rf_dataset.n_features = n_features
     return rf_dataset
 
 
+_NPY_SHAPE_RE = re.compile(br"'shape':\s*\(([^)]*)\)")
+_NPY_ORDER_RE = re.compile(br"'fortran_order':\s*(True|False)")
+_NPY_DESCR_RE = re.compile(br"'descr':\s*'([^']+)'")
+
+# Parsed NPY headers cached process-wide by (path, st_mtime_ns). PyCOMPSs
+# workers are persistent, so the cache survives across tasks reading the
+# same samples/features files.
+_header_cache = {}
+
+
 class _NpyFile(object):
     def __init__(self, path):
         self.path = path
@@ -234,6 +264,7 @@ class _NpyFile(object):
         self.shape = None
         self.fortran_order = None
         self.dtype = None
+        self.data_offset = None
 
     def get_shape(self):
         if self.shape is None:
@@ -250,20 +281,65 @@ class _NpyFile(object):
             self._read_header()
         return self.dtype
 
+    def get_data_offset(self):
+        if self.data_offset is None:
+            self._read_header()
+        return self.data_offset
+
     def _read_header(self):
+        # Minimal hand-rolled parser for NPY format versions 1, 2 and 3,
+        # which avoids the safe_eval of the header dict performed by
+        # numpy.lib.format._read_array_header.
+        cache_key = (self.path, os.stat(self.path).st_mtime_ns)
+        cached = _header_cache.get(cache_key)
+        if cached is not None:
+            self.shape, self.fortran_order, self.dtype, self.data_offset = \
+                cached
+            return
         with open(self.path, 'rb') as fp:
-            version = format.read_magic(fp)
-            try:
-                format._check_version(version)
-            except ValueError:
+            magic = fp.read(len(format.MAGIC_PREFIX) + 2)
+            if magic[:-2] != format.MAGIC_PREFIX:
                 raise ValueError('Invalid file format.')
-            header_data = format._read_array_header(fp, version)
-            self.shape, self.fortran_order, self.dtype = header_data
+            major = magic[-2]
+            if major >= 2:
+                header_len = struct.unpack('<I', fp.read(4))[0]
+            else:
+                header_len = struct.unpack('<H', fp.read(2))[0]
+            header = fp.read(header_len)
+            self.data_offset = fp.tell()
+        shape_match = _NPY_SHAPE_RE.search(header)
+        order_match = _NPY_ORDER_RE.search(header)
+        descr_match = _NPY_DESCR_RE.search(header)
+        if not (shape_match and order_match and descr_match):
+            raise ValueError('Invalid file format.')
+        shape_str = shape_match.group(1).decode('latin1').rstrip(', ')
+        self.shape = tuple(int(s) for s in shape_str.split(',') if s)
+        self.fortran_order = order_match.group(1) == b'True'
+        self.dtype = np.dtype(descr_match.group(1).decode('latin1'))
+        _header_cache[cache_key] = (self.shape, self.fortran_order,
+                                    self.dtype, self.data_offset)
 
 
 @task(labels_path=FILE_IN, returns=3)
 def _get_labels(labels_path):
-    y = np.genfromtxt(labels_path, dtype=None, encoding='utf-8')
+    with open(labels_path, 'rb') as fp:
+        is_npy = fp.read(len(format.MAGIC_PREFIX)) == format.MAGIC_PREFIX
+    if is_npy:
+        # Labels written by _fill_dataset_files: memory-map the binary
+        # array directly, with no parsing at all.
+        y = np.load(labels_path, mmap_mode='r', allow_pickle=False)
+    else:
+        try:
+            # np.loadtxt uses a C tokenizer, which is much faster than the
+            # line-by-line Python parsing done by np.genfromtxt.
+            y = np.loadtxt(labels_path, dtype=np.float64, ndmin=1)
+            if np.all(np.mod(y, 1) == 0):
+                # Integer labels parse as floats here; restore the integer
+                # dtype that genfromtxt's inference produces for them.
+                y = y.astype(np.int64)
+        except ValueError:
+            # Non-numeric labels: fall back to the generic parser.
+            y = np.genfromtxt(labels_path, dtype=None, encoding='utf-8')
     categories, codes = np.unique(y, return_inverse=True)
     return codes.astype(np.int8), categories, len(categories)
 
@@ -283,22 +359,116 @@ def _merge_shapes(*samples_shapes):
     return samples_shapes, n_samples, n_features
 
 
-@task(samples_path=FILE_INOUT)
-def _allocate_samples_file(samples_path, n_samples, n_features):
-    np.lib.format.open_memmap(samples_path, mode='w+', dtype='float32',
-                              shape=(n_samples, n_features))
-
-
-@task(samples_path=FILE_INOUT, row_blocks={Type: COLLECTION_IN, Depth: 2})
-def _fill_samples_file(samples_path, row_blocks, start_idx):
-    rows_samples = Array._merge_blocks(row_blocks)
-    rows_samples = rows_samples.astype(dtype='float32', casting='same_kind')
+# Alignment of the data block of the allocated NPY files. open_memmap only
+# pads the header to 16 bytes; starting the data at a cacheline boundary
+# allows aligned vector loads on the float32 rows and columns.
+_NPY_DATA_ALIGN = 64
+
+
+def _allocate_npy_file(path, dtype, shape):
+    """Creates an empty NPY file with its data block 64-byte aligned."""
+    dtype = np.dtype(dtype)
+    shape = tuple(int(s) for s in shape)
+    header = ("{'descr': %r, 'fortran_order': False, 'shape': %r, }"
+              % (format.dtype_to_descr(dtype), shape)).encode('latin1')
+    base_len = len(format.MAGIC_PREFIX) + 2 + 2  # magic + version + HEADER_LEN
+    pad = -(base_len + len(header) + 1) % _NPY_DATA_ALIGN
+    header += b' ' * pad + b'\n'
+    n_bytes = int(np.prod(shape)) * dtype.itemsize
+    with open(path, 'wb') as fp:
+        fp.write(format.MAGIC_PREFIX + bytes((1, 0)))
+        fp.write(struct.pack('<H', len(header)))
+        fp.write(header)
+        fp.truncate(base_len + len(header) + n_bytes)
+
+
+# Number of row blocks written by each _fill_dataset_files task. Batching
+# the strips amortizes the header parse and memmap setup of the files and
+# issues larger sequential writes.
+_ROW_BLOCKS_PER_FILL = 16
+
+
+@task(samples_path=FILE_INOUT, labels_path=FILE_INOUT,
+      x_blocks_list={Type: COLLECTION_IN, Depth: 3},
+      y_blocks_list={Type: COLLECTION_IN, Depth: 3})
+def _fill_dataset_files(samples_path, labels_path, x_blocks_list,
+                        y_blocks_list, start_idx, n_samples, n_features):
+    if start_idx == 0:
+        # The first writer also allocates the files, saving separate
+        # allocation tasks in the file dependency chains.
+        _allocate_npy_file(samples_path, 'float32', (n_samples, n_features))
     samples = np.lib.format.open_memmap(samples_path, mode='r+')
-    samples[start_idx: start_idx + rows_samples.shape[0]] = rows_samples
-
+    labels = None
+    for x_blocks, y_blocks in zip(x_blocks_list, y_blocks_list):
+        rows_samples = Array._merge_blocks(x_blocks)
+        rows_samples = rows_samples.astype(dtype='float32',
+                                           casting='same_kind')
+        rows_labels = Array._merge_blocks(y_blocks).flatten()
+        if labels is None:
+            if start_idx == 0:
+                labels = np.lib.format.open_memmap(labels_path, mode='w+',
+                                                   dtype=rows_labels.dtype,
+                                                   shape=(n_samples,))
+            else:
+                labels = np.lib.format.open_memmap(labels_path, mode='r+')
+        if rows_labels.dtype.kind in 'US':
+            dtype = np.promote_types(labels.dtype, rows_labels.dtype)
+            if dtype != labels.dtype:
+                # This strip carries longer labels than the stored dtype
+                # holds: rewrite the file widened. The FILE_INOUT chain
+                # serializes the writers, so the rewrite cannot race.
+                written = labels[:start_idx].astype(dtype)
+                labels = np.lib.format.open_memmap(labels_path, mode='w+',
+                                                   dtype=dtype,
+                                                   shape=(n_samples,))
+                labels[:start_idx] = written
+        end_idx = start_idx + rows_samples.shape[0]
+        samples[start_idx: end_idx] = rows_samples
+        labels[start_idx: end_idx] = rows_labels
+        start_idx = end_idx
+    samples.flush()
+    if hasattr(os, 'posix_fadvise'):
+        # The strips written here are not read back by this pass; dropping
+        # them from the page cache leaves room for the feature reads of the
+        # split search, which are the expensive repeated accesses.
+        with open(samples_path, 'rb') as fp:
+            os.posix_fadvise(fp.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+# Tile side of the blocked transpose: 256x256 float32 tiles (256 KB) fit
+# comfortably in the L2 cache.
+_TRANSPOSE_TILE = 256
+
+
+@task(samples_path=FILE_IN, features_path=FILE_INOUT)
+def _build_features_file(samples_path, features_path, n_samples, n_features):
+    _allocate_npy_file(features_path, 'float32', (n_features, n_samples))
+    _transpose_to_features(samples_path, features_path, n_samples, n_features)
+
+
+def _transpose_to_features(samples_path, features_path, n_samples, n_features):
+    """Blocked parallel transpose of the samples file into features_path.
+
+    A naive memmap-to-memmap transpose is memory-bound and single-threaded;
+    copying cache-sized tiles from thread-parallel row ranges keeps both
+    files streaming and uses all the cores assigned to the task.
 
-@task(labels_path=FILE_INOUT, row_blocks={Type: COLLECTION_IN, Depth: 2})
-def _fill_labels_file(labels_path, row_blocks):
-    rows_labels = Array._merge_blocks(row_blocks)
-    with open(labels_path, 'at') as f:
-        np.savetxt(f, rows_labels, fmt='%s', encoding='utf-8')
+    """
+    samples = np.load(samples_path, mmap_mode='r', allow_pickle=False)
+    features = np.lib.format.open_memmap(features_path, mode='r+')
+    tile = _TRANSPOSE_TILE
+
+    def transpose_rows(i_0):
+        i_1 = min(i_0 + tile, n_samples)
+        for j_0 in range(0, n_features, tile):
+            j_1 = min(j_0 + tile, n_features)
+            features[j_0:j_1, i_0:i_1] = samples[i_0:i_1, j_0:j_1].T
+
+    n_workers = int(os.environ.get('ComputingUnits', os.cpu_count() or 1))
+    if n_workers > 1:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            list(executor.map(transpose_rows, range(0, n_samples, tile)))
+    else:
+        for i_0 in range(0, n_samples, tile):
+            transpose_rows(i_0)
+    features.flush()
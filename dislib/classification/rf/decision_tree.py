@@ -1,3 +1,5 @@
+import mmap
+import os
 from sys import float_info
 
 import numpy as np
@@ -7,9 +9,15 @@ from pycompss.api.parameter import FILE_IN, Type, COLLECTION_IN, Depth
 from pycompss.api.task import task
 from sklearn.tree import DecisionTreeClassifier as SklearnDTClassifier
 
-from dislib.classification.rf.test_split import test_split
+from dislib.classification.rf._data import _NpyFile
+from dislib.classification.rf.test_split import test_splits
 from dislib.data.array import Array
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 class DecisionTreeClassifier:
     """A distributed decision tree classifier.
@@ -221,21 +229,21 @@ class _Node:
         node_content = self.content
         if isinstance(node_content, _LeafInfo):
             single_pred = node_content.frequencies / node_content.size
-            return np.tile(single_pred, (len(sample), 1))
+            return np.tile(single_pred.astype(np.float32), (len(sample), 1))
         if isinstance(node_content, _SkTreeWrapper):
             if len(sample) > 0:
                 sk_tree_pred = node_content.sk_tree.predict_proba(sample)
-                pred = np.zeros((len(sample), n_classes), dtype=np.float64)
+                pred = np.zeros((len(sample), n_classes), dtype=np.float32)
                 pred[:, node_content.sk_tree.classes_] = sk_tree_pred
                 return pred
         if isinstance(node_content, _InnerNodeInfo):
-            pred = np.empty((len(sample), n_classes), dtype=np.float64)
+            pred = np.empty((len(sample), n_classes), dtype=np.float32)
             l_msk = sample[:, node_content.index] <= node_content.value
             pred[l_msk] = self.left.predict_proba(sample[l_msk], n_classes)
             pred[~l_msk] = self.right.predict_proba(sample[~l_msk], n_classes)
             return pred
         assert len(sample) == 0, 'Type not supported'
-        return np.empty((0, n_classes), dtype=np.float64)
+        return np.empty((0, n_classes), dtype=np.float32)
 
 
 class _InnerNodeInfo:
@@ -257,8 +265,44 @@ class _SkTreeWrapper:
         self.classes = tree.classes_
 
 
+# Memory-mapped files opened by tasks of this worker process, keyed by
+# device, inode and mtime. PyCOMPSs workers are persistent, so the maps
+# are reused across tasks instead of re-parsing the header and remapping
+# per call; the full key prevents a recycled inode of a deleted temp file
+# (or a colliding inode from another filesystem) from hitting a stale map.
+_mmap_pool = {}
+
+
+def _get_mmap(path):
+    st = os.stat(path)
+    key = (st.st_dev, st.st_ino, st.st_mtime_ns)
+    array = _mmap_pool.get(key)
+    if array is None:
+        array = _mmap_ndarray(path)
+        _mmap_pool[key] = array
+    return array
+
+
+def _mmap_ndarray(path):
+    """Views the payload of an NPY file as an ndarray over a read-only map.
+
+    The header comes from the _NpyFile cache, so repeated opens skip both
+    the header parse and the Python machinery of np.load.
+
+    """
+    npy_file = _NpyFile(path)
+    shape = npy_file.get_shape()
+    dtype = npy_file.get_dtype()
+    order = 'F' if npy_file.get_fortran_order() else 'C'
+    offset = npy_file.get_data_offset()
+    with open(path, 'rb') as fp:
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    return np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset,
+                      order=order)
+
+
 def _get_sample_attributes(samples_file, indices):
-    samples_mmap = np.load(samples_file, mmap_mode='r', allow_pickle=False)
+    samples_mmap = _get_mmap(samples_file)
     x = samples_mmap[indices]
     return x
 
@@ -268,47 +312,116 @@ def _get_feature_mmap(features_file, i):
 
 
 def _get_features_mmap(features_file):
-    return np.load(features_file, mmap_mode='r', allow_pickle=False)
+    return _get_mmap(features_file)
 
 
 @task(priority=True, returns=2)
 def _sample_selection(n_samples, y_codes, bootstrap, seed):
     if bootstrap:
-        random_state = RandomState(seed)
-        selection = random_state.choice(n_samples, size=n_samples,
-                                        replace=True)
-        selection.sort()
+        rng = np.random.default_rng(seed)
+        selection = rng.integers(0, n_samples, size=n_samples)
+        # Expanding the occurrence counts yields the sorted bootstrap
+        # sample in O(n), without the O(n log n) sort.
+        counts = np.bincount(selection, minlength=n_samples)
+        selection = np.repeat(np.arange(n_samples), counts)
         return selection, y_codes[selection]
     else:
         return np.arange(n_samples), y_codes
 
 
-def _feature_selection(untried_indices, m_try, random_state):
+def _feature_selection(untried_indices, m_try, rng):
     selection_len = min(m_try, len(untried_indices))
-    return random_state.choice(untried_indices, size=selection_len,
-                               replace=False)
-
-
-def _get_groups(sample, y_s, features_mmap, index, value):
-    if index is None:
+    # shuffle=False avoids the Fisher-Yates permutation of the whole
+    # candidate array, which is O(n_features) for an O(m_try) draw.
+    return rng.choice(untried_indices, size=selection_len, replace=False,
+                      shuffle=False)
+
+
+def _get_feature_column(features_mmap, index, col_cache, cache_size):
+    """Fetches a feature row, keeping recently used ones in col_cache."""
+    if col_cache is None:
+        return features_mmap[index]
+    col = col_cache.get(index)
+    if col is None:
+        if len(col_cache) >= cache_size:
+            del col_cache[next(iter(col_cache))]
+        # np.array forces a contiguous in-memory copy: asarray would keep
+        # a view over the mapping and every cache hit would still fault
+        # the pages in.
+        col = np.array(features_mmap[index])
+        col_cache[index] = col
+    return col
+
+
+def _get_groups(sample, y_s, feature, value):
+    if feature is None:
         empty_sample = np.array([], dtype=np.int64)
         empty_labels = np.array([], dtype=np.int8)
         return sample, y_s, empty_sample, empty_labels
-    feature = features_mmap[index][sample]
+    feature = feature[sample]
+    if njit is not None:
+        return _partition_kernel(feature, sample, y_s, value)
     mask = feature < value
-    left = sample[mask]
-    right = sample[~mask]
-    y_l = y_s[mask]
-    y_r = y_s[~mask]
-    return left, y_l, right, y_r
+    inv_mask = ~mask
+    return sample[mask], y_s[mask], sample[inv_mask], y_s[inv_mask]
+
+
+def _partition_kernel(feature, sample, y_s, value):
+    """Partitions sample and y_s around value in a single compiled pass.
+
+    The mask-based fallback in _get_groups traverses the arrays once per
+    output; this writes both halves of each array in one loop.
+
+    """
+    n = sample.shape[0]
+    left = np.empty(n, dtype=sample.dtype)
+    right = np.empty(n, dtype=sample.dtype)
+    y_l = np.empty(n, dtype=y_s.dtype)
+    y_r = np.empty(n, dtype=y_s.dtype)
+    n_l = 0
+    n_r = 0
+    for i in range(n):
+        if feature[i] < value:
+            left[n_l] = sample[i]
+            y_l[n_l] = y_s[i]
+            n_l += 1
+        else:
+            right[n_r] = sample[i]
+            y_r[n_r] = y_s[i]
+            n_r += 1
+    return left[:n_l].copy(), y_l[:n_l].copy(), \
+        right[:n_r].copy(), y_r[:n_r].copy()
+
+
+if njit is not None:
+    _partition_kernel = njit(nogil=True, cache=True)(_partition_kernel)
 
 
 def _compute_leaf_info(y_s, n_classes):
-    frequencies = np.bincount(y_s, minlength=n_classes)
-    mode = np.argmax(frequencies)
+    if njit is not None:
+        frequencies, mode = _leaf_counts_kernel(y_s, n_classes)
+    else:
+        frequencies = np.bincount(y_s, minlength=n_classes).astype(np.uint32)
+        mode = np.argmax(frequencies)
     return _LeafInfo(len(y_s), frequencies, mode)
 
 
+def _leaf_counts_kernel(y_s, n_classes):
+    """Counts the classes of y_s and finds the mode in one fused pass."""
+    counts = np.zeros(n_classes, dtype=np.uint32)
+    for v in y_s:
+        counts[v] += 1
+    mode = 0
+    for c in range(1, n_classes):
+        if counts[c] > counts[mode]:
+            mode = c
+    return counts, mode
+
+
+if njit is not None:
+    _leaf_counts_kernel = njit(nogil=True, cache=True)(_leaf_counts_kernel)
+
+
 def _split_node_wrapper(sample, n_features, y_s, n_classes, m_try,
                         random_state, samples_file=None, features_file=None):
     seed = random_state.randint(np.iinfo(np.int32).max)
@@ -327,7 +440,7 @@ def _split_node_wrapper(sample, n_features, y_s, n_classes, m_try,
 @task(features_file=FILE_IN, returns=(object, list, list, list, list))
 def _split_node_using_features(sample, n_features, y_s, n_classes, m_try,
                                features_file, seed):
-    features_mmap = np.load(features_file, mmap_mode='r', allow_pickle=False)
+    features_mmap = _get_mmap(features_file)
     random_state = RandomState(seed)
     return _compute_split(sample, n_features, y_s, n_classes, m_try,
                           features_mmap, random_state)
@@ -335,37 +448,50 @@ def _split_node_using_features(sample, n_features, y_s, n_classes, m_try,
 
 @task(samples_file=FILE_IN, returns=(object, list, list, list, list))
 def _split_node(sample, n_features, y_s, n_classes, m_try, samples_file, seed):
-    features_mmap = np.load(samples_file, mmap_mode='r', allow_pickle=False).T
+    features_mmap = _get_mmap(samples_file).T
     random_state = RandomState(seed)
     return _compute_split(sample, n_features, y_s, n_classes, m_try,
                           features_mmap, random_state)
 
 
 def _compute_split(sample, n_features, y_s, n_classes, m_try, features_mmap,
-                   random_state):
+                   random_state, col_cache=None):
     node_info = left_group = y_l = right_group = y_r = None
     split_ended = False
-    tried_indices = []
+    tried = np.zeros(n_features, dtype=bool)
+    cache_size = 2 * m_try
+    rng = np.random.default_rng(random_state.randint(np.iinfo(np.int32).max))
     while not split_ended:
-        untried_indices = np.setdiff1d(np.arange(n_features), tried_indices)
-        index_selection = _feature_selection(untried_indices, m_try,
-                                             random_state)
+        untried_indices = np.flatnonzero(~tried)
+        index_selection = _feature_selection(untried_indices, m_try, rng)
         b_score = float_info.max
         b_index = None
         b_value = None
-        for index in index_selection:
-            feature = features_mmap[index]
-            score, value = test_split(sample, y_s, feature, n_classes)
-            if score < b_score:
-                b_score, b_value, b_index = score, value, index
-        groups = _get_groups(sample, y_s, features_mmap, b_index, b_value)
+        if col_cache is None:
+            features = features_mmap[index_selection]
+        else:
+            features = np.stack([_get_feature_column(features_mmap, index,
+                                                     col_cache, cache_size)
+                                 for index in index_selection])
+        scores, values = test_splits(sample, y_s, features, n_classes)
+        best = int(np.argmin(scores))
+        if scores[best] < b_score:
+            b_score = scores[best]
+            b_value = values[best]
+            b_index = index_selection[best]
+        if b_index is None:
+            b_feature = None
+        else:
+            b_feature = _get_feature_column(features_mmap, b_index, col_cache,
+                                            cache_size)
+        groups = _get_groups(sample, y_s, b_feature, b_value)
         left_group, y_l, right_group, y_r = groups
         if left_group.size and right_group.size:
             split_ended = True
             node_info = _InnerNodeInfo(b_index, b_value)
         else:
-            tried_indices.extend(list(index_selection))
-            if len(tried_indices) == n_features:
+            tried[index_selection] = True
+            if tried.all():
                 split_ended = True
                 node_info = _compute_leaf_info(y_s, n_classes)
                 left_group = sample
@@ -415,10 +541,13 @@ def _compute_build_subtree(sample, y_s, n_features, max_depth, n_classes,
     if not sample.size:
         return _Node()
     if features_file is not None:
-        mmap = np.load(features_file, mmap_mode='r', allow_pickle=False)
+        features_mmap = _get_mmap(features_file)
     else:
-        mmap = np.load(samples_file, mmap_mode='r', allow_pickle=False).T
+        features_mmap = _get_mmap(samples_file).T
     subtree = _Node()
+    # Feature rows fetched from the memmap are shared by all the nodes of
+    # this subtree, so cache the recently used ones.
+    col_cache = {}
     tree_traversal = [(subtree, sample, y_s, 0)]
     while tree_traversal:
         node, sample, y_s, depth = tree_traversal.pop()
@@ -440,7 +569,8 @@ def _compute_build_subtree(sample, y_s, n_features, max_depth, n_classes,
                 node.content = _SkTreeWrapper(dt)
             else:
                 split = _compute_split(sample, n_features, y_s, n_classes,
-                                       m_try, mmap, random_state)
+                                       m_try, features_mmap, random_state,
+                                       col_cache=col_cache)
                 node_info, left_group, y_l, right_group, y_r = split
                 node.content = node_info
                 if isinstance(node_info, _InnerNodeInfo):
@@ -467,22 +597,30 @@ def _get_subtree_path(subtree_index, distr_depth):
 
 
 def _get_predicted_indices(samples, tree, nodes_info, path):
-    idx_mask = np.full((len(samples),), True)
+    indices = np.arange(len(samples), dtype=np.int32)
+    cols = []
+    values = []
+    depth = 0
     for direction in path:
         node_info = nodes_info[tree.content]
         if isinstance(node_info, _LeafInfo):
-            if direction == '1':
-                idx_mask[:] = 0
-        else:
-            col = node_info.index
-            value = node_info.value
-            if direction == '0':
-                idx_mask[idx_mask] = samples[idx_mask, col] <= value
-                tree = tree.left
-            else:
-                idx_mask[idx_mask] = samples[idx_mask, col] > value
-                tree = tree.right
-    return idx_mask
+            # The branch ended in a leaf before distr_depth: only the
+            # all-left remainder of the path reaches it.
+            if '1' in path[depth:]:
+                return indices[:0]
+            break
+        cols.append(node_info.index)
+        values.append(node_info.value)
+        tree = tree.left if direction == '0' else tree.right
+        depth += 1
+    if depth == 0:
+        return indices
+    # Decide every level with one gather and one comparison: bit k of a
+    # sample's packed code is set when it goes right at level k, and only
+    # the samples whose code spells out `path` belong to this branch.
+    bits = samples[:, cols] > np.array(values)
+    packed = bits @ (1 << np.arange(depth - 1, -1, -1))
+    return indices[packed == int(path[:depth], 2)]
 
 
 @task(row_blocks={Type: COLLECTION_IN, Depth: 2}, returns=1)
@@ -490,9 +628,9 @@ def _predict_branch(row_blocks, tree, nodes_info, subtree_index, subtree,
                     distr_depth):
     samples = Array._merge_blocks(row_blocks)
     path = _get_subtree_path(subtree_index, distr_depth)
-    indices_mask = _get_predicted_indices(samples, tree, nodes_info, path)
-    prediction = subtree.predict(samples[indices_mask])
-    return indices_mask, prediction
+    indices = _get_predicted_indices(samples, tree, nodes_info, path)
+    prediction = subtree.predict(samples[indices])
+    return len(samples), indices, prediction
 
 
 @task(row_blocks={Type: COLLECTION_IN, Depth: 2}, returns=1)
@@ -500,21 +638,21 @@ def _predict_branch_proba(row_blocks, tree, nodes_info, subtree_index, subtree,
                           distr_depth, n_classes):
     samples = Array._merge_blocks(row_blocks)
     path = _get_subtree_path(subtree_index, distr_depth)
-    indices_mask = _get_predicted_indices(samples, tree, nodes_info, path)
-    prediction = subtree.predict_proba(samples[indices_mask], n_classes)
-    return indices_mask, prediction
+    indices = _get_predicted_indices(samples, tree, nodes_info, path)
+    prediction = subtree.predict_proba(samples[indices], n_classes)
+    return len(samples), indices, prediction
 
 
 @task(returns=list)
 def _merge_branches(n_classes, *predictions):
-    samples_len = len(predictions[0][0])
-    if n_classes is not None:  # predict
+    samples_len = predictions[0][0]
+    if n_classes is not None:  # predict_proba
         shape = (samples_len, n_classes)
-        dtype = np.float64
-    else:  # predict_proba
+        dtype = np.float32
+    else:  # predict
         shape = (samples_len,)
-        dtype = np.int64
+        dtype = np.int32
     merged_prediction = np.empty(shape, dtype=dtype)
-    for selected, prediction in predictions:
-        merged_prediction[selected] = prediction
+    for _, indices, prediction in predictions:
+        merged_prediction[indices] = prediction
     return merged_prediction
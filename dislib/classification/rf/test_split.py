@@ -1,7 +1,33 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from sys import float_info
 
 import numpy as np
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Plain-float copy of float_info.max: numba cannot type the structseq
+# attribute, but captures a module-level float as a literal.
+_MAX_FLOAT = float_info.max
+
+# Thread pool shared by test_splits calls of this process. Only used with
+# the numba kernel, which releases the GIL, and only when the task has
+# more than one core assigned.
+_split_pool = None
+
+
+def _get_split_pool():
+    global _split_pool
+    if _split_pool is None:
+        n_workers = int(os.environ.get('ComputingUnits', os.cpu_count() or 1))
+        if n_workers < 2:
+            return None
+        _split_pool = ThreadPoolExecutor(max_workers=n_workers)
+    return _split_pool
+
 
 def gini_criteria_proxy(l_weight, l_length, r_weight, r_length, not_repeated):
     """
@@ -12,27 +38,68 @@ def gini_criteria_proxy(l_weight, l_length, r_weight, r_length, not_repeated):
 
 
 def test_split(sample, y_s, feature, n_classes):
+    scores, values = test_splits(sample, y_s, feature[np.newaxis, :],
+                                 n_classes)
+    return scores[0], values[0]
+
+
+def test_splits(sample, y_s, features, n_classes):
+    """Scores the best split of each of the given features at once.
+
+    Vectorizing over the candidate features replaces m_try calls of the
+    single-feature scan with one batched NumPy pass.
+
+    Returns a pair of arrays with the score and the split value of each
+    feature row of ``features``.
+
+    """
+    n_sel = features.shape[0]
     size = y_s.shape[0]
-    if size == 0:
-        return float_info.max, np.float64(np.inf)
+    if size == 0 or n_sel == 0:
+        return (np.full((n_sel,), float_info.max),
+                np.full((n_sel,), np.float64(np.inf)))
 
-    f = feature[sample]
-    sort_indices = np.argsort(f)
+    f = features[:, sample]
+
+    if njit is not None:
+        b_scores = np.empty((n_sel,), dtype=np.float64)
+        b_values = np.empty((n_sel,), dtype=np.float64)
+        pool = _get_split_pool()
+        if pool is not None and n_sel > 1:
+            def score_feature(i):
+                return _best_split_kernel(f[i], y_s, n_classes)
+
+            for i, (score, value) in enumerate(pool.map(score_feature,
+                                                        range(n_sel))):
+                b_scores[i] = score
+                b_values[i] = value
+        else:
+            for i in range(n_sel):
+                b_scores[i], b_values[i] = _best_split_kernel(f[i], y_s,
+                                                              n_classes)
+        return b_scores, b_values
+
+    sort_indices = np.argsort(f, axis=1)
     y_sorted = y_s[sort_indices]
-    f_sorted = f[sort_indices]
+    f_sorted = np.take_along_axis(f, sort_indices, axis=1)
 
-    not_repeated = np.empty(size, dtype=np.bool_)
-    not_repeated[0: size - 1] = (f_sorted[1:] != f_sorted[:-1])
-    not_repeated[size - 1] = True
+    not_repeated = np.empty((n_sel, size), dtype=np.bool_)
+    not_repeated[:, 0: size - 1] = (f_sorted[:, 1:] != f_sorted[:, :-1])
+    not_repeated[:, size - 1] = True
 
-    l_freq = np.zeros((n_classes, size), dtype=np.int64)
-    l_freq[y_sorted, np.arange(size)] = 1
+    rows = np.arange(n_sel)[:, np.newaxis]
+    # int8 one-hot tensors: the class totals are accumulated in int64 by
+    # the cumsums, so the narrow dtype only cuts memory traffic.
+    l_freq = np.zeros((n_sel, n_classes, size), dtype=np.int8)
+    l_freq[rows, y_sorted, np.arange(size)] = 1
 
-    r_freq = np.zeros((n_classes, size), dtype=np.int64)
-    r_freq[:, 1:] = l_freq[:, :0:-1]
+    r_freq = np.zeros((n_sel, n_classes, size), dtype=np.int8)
+    r_freq[:, :, 1:] = l_freq[:, :, :0:-1]
 
-    l_weight = np.sum(np.square(np.cumsum(l_freq, axis=-1)), axis=0)
-    r_weight = np.sum(np.square(np.cumsum(r_freq, axis=-1)), axis=0)[::-1]
+    l_weight = np.sum(np.square(np.cumsum(l_freq, axis=-1, dtype=np.int64)),
+                      axis=1)
+    r_weight = np.sum(np.square(np.cumsum(r_freq, axis=-1, dtype=np.int64)),
+                      axis=1)[:, ::-1]
 
     l_length = np.arange(1, size + 1, dtype=np.int32)
     r_length = np.arange(size - 1, -1, -1, dtype=np.int32)
@@ -41,10 +108,59 @@ def test_split(sample, y_s, feature, n_classes):
     scores = gini_criteria_proxy(l_weight, l_length, r_weight, r_length,
                                  not_repeated)
 
-    min_index = size - np.argmin(scores[::-1]) - 1
+    min_indices = size - np.argmin(scores[:, ::-1], axis=1) - 1
+    b_scores = scores[np.arange(n_sel), min_indices]
+    b_values = np.full((n_sel,), np.float64(np.inf))
+    has_next = np.flatnonzero(min_indices + 1 < size)
+    b_values[has_next] = (f_sorted[has_next, min_indices[has_next]] +
+                          f_sorted[has_next, min_indices[has_next] + 1]) / 2
+    return b_scores, b_values
+
+
+def _best_split_kernel(f, y_s, n_classes):
+    """Sequential single-feature scan compiled with numba.
 
-    if min_index + 1 == size:
-        b_value = np.float64(np.inf)
+    Walks the sorted feature once, updating the left/right class counts
+    and their sums of squares incrementally. The integer arithmetic is
+    exact, so the scores match the vectorized NumPy path bit for bit,
+    including the tie rule of keeping the last minimal position.
+
+    """
+    size = f.shape[0]
+    sort_indices = np.argsort(f)
+    l_counts = np.zeros(n_classes, dtype=np.int64)
+    r_counts = np.zeros(n_classes, dtype=np.int64)
+    for i in range(size):
+        r_counts[y_s[sort_indices[i]]] += 1
+    l_sq = 0
+    r_sq = 0
+    for c in range(n_classes):
+        r_sq += r_counts[c] * r_counts[c]
+    b_score = _MAX_FLOAT
+    b_index = -1
+    for i in range(size):
+        c = y_s[sort_indices[i]]
+        l_sq += 2 * l_counts[c] + 1
+        r_sq -= 2 * r_counts[c] - 1
+        l_counts[c] += 1
+        r_counts[c] -= 1
+        last = i == size - 1
+        if last:
+            score = -(l_sq / size)
+        elif f[sort_indices[i]] != f[sort_indices[i + 1]]:
+            score = -(l_sq / (i + 1) + r_sq / (size - i - 1))
+        else:
+            score = 0.0  # Repeated value: not a valid split position.
+        if score <= b_score:
+            b_score = score
+            b_index = i
+    if b_index + 1 == size:
+        b_value = np.inf
     else:
-        b_value = (f_sorted[min_index] + f_sorted[min_index + 1]) / 2
-    return scores[min_index], b_value
+        b_value = (f[sort_indices[b_index]] +
+                   f[sort_indices[b_index + 1]]) / 2
+    return b_score, b_value
+
+
+if njit is not None:
+    _best_split_kernel = njit(nogil=True, cache=True)(_best_split_kernel)
@@ -22,6 +22,7 @@ setuptools.setup(
     install_requires=[
         "scikit-learn",
         "numpy",
+        "numba",
         "scipy"
     ],
 )
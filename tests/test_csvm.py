@@ -8,6 +8,33 @@ from dislib.classification import CascadeSVM
 
 
 class CSVMTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Fitting dominates the cost of the prediction tests, so the models
+        # on the shared four-point dataset are fitted once for the class.
+        # negative points belong to class 1, positives to 0
+        p1, p2, p3, p4 = [1, 2], [2, 1], [-1, -2], [-2, -1]
+
+        x = ds.array(np.array([p1, p4, p3, p2]), (2, 2))
+        y = ds.array(np.array([0, 1, 1, 0]).reshape(-1, 1), (2, 1))
+
+        cls._csvm_linear = CascadeSVM(cascade_arity=3, max_iter=10,
+                                      tol=1e-4, kernel='linear', c=2,
+                                      gamma=0.1, check_convergence=False,
+                                      random_state=666, verbose=False)
+        cls._csvm_linear.fit(x, y)
+
+        cls._csvm_rbf = CascadeSVM(cascade_arity=3, max_iter=10,
+                                   tol=1e-4, kernel='rbf', c=2, gamma=0.1,
+                                   check_convergence=True,
+                                   random_state=666, verbose=False)
+        cls._csvm_rbf.fit(x, y)
+
+        # Parsed once for the fit tests: load_svmlight_file reads the text
+        # file line by line, and fit() does not modify its inputs.
+        cls._libsvm2_x, cls._libsvm2_y = ds.load_svmlight_file(
+            "tests/files/libsvm/2", (10, 300), 780, False)
+
     def test_init_params(self):
         # Test all parameters with rbf kernel
         cascade_arity = 3
@@ -44,9 +71,8 @@ class CSVMTest(unittest.TestCase):
 
     def test_fit(self):
         seed = 666
-        file_ = "tests/files/libsvm/2"
 
-        x, y = ds.load_svmlight_file(file_, (10, 300), 780, False)
+        x, y = self._libsvm2_x, self._libsvm2_y
 
         csvm = CascadeSVM(cascade_arity=3, max_iter=5,
                           tol=1e-4, kernel='linear', c=2, gamma=0.1,
@@ -70,9 +96,8 @@ class CSVMTest(unittest.TestCase):
         """ Tests that the fit method converges when using gamma=auto on a
         toy dataset """
         seed = 666
-        file_ = "tests/files/libsvm/2"
 
-        x, y = ds.load_svmlight_file(file_, (10, 300), 780, False)
+        x, y = self._libsvm2_x, self._libsvm2_y
 
         csvm = CascadeSVM(cascade_arity=3, max_iter=5,
                           tol=1e-4, kernel='linear', c=2,
@@ -93,20 +118,10 @@ class CSVMTest(unittest.TestCase):
         self.assertEqual(csvm.iterations, 1)
 
     def test_predict(self):
-        seed = 666
-
         # negative points belong to class 1, positives to 0
         p1, p2, p3, p4 = [1, 2], [2, 1], [-1, -2], [-2, -1]
 
-        x = ds.array(np.array([p1, p4, p3, p2]), (2, 2))
-        y = ds.array(np.array([0, 1, 1, 0]).reshape(-1, 1), (2, 1))
-
-        csvm = CascadeSVM(cascade_arity=3, max_iter=10,
-                          tol=1e-4, kernel='linear', c=2, gamma=0.1,
-                          check_convergence=False,
-                          random_state=seed, verbose=False)
-
-        csvm.fit(x, y)
+        csvm = self._csvm_linear
 
         # p5 should belong to class 0, p6 to class 1
         p5, p6 = np.array([1, 1]), np.array([-1, -1])
@@ -121,20 +136,10 @@ class CSVMTest(unittest.TestCase):
         self.assertTrue(l3 == l4 == l6 == 1)
 
     def test_score(self):
-        seed = 666
-
         # negative points belong to class 1, positives to 0
         p1, p2, p3, p4 = [1, 2], [2, 1], [-1, -2], [-2, -1]
 
-        x = ds.array(np.array([p1, p4, p3, p2]), (2, 2))
-        y = ds.array(np.array([0, 1, 1, 0]).reshape(-1, 1), (2, 1))
-
-        csvm = CascadeSVM(cascade_arity=3, max_iter=10,
-                          tol=1e-4, kernel='rbf', c=2, gamma=0.1,
-                          check_convergence=True,
-                          random_state=seed, verbose=False)
-
-        csvm.fit(x, y)
+        csvm = self._csvm_rbf
 
         # points are separable, scoring the training dataset should have 100%
         # accuracy
@@ -194,7 +194,7 @@ class RFTest(unittest.TestCase):
         accuracy = compss_wait_on(rf.score(ds_validate, validate_y))
 
         # Accuracy should be <= 2/3 for any seed, often exactly equal.
-        self.assertAlmostEqual(accuracy, 2 / 3)
+        self.assertLessEqual(accuracy, 2 / 3)
 
 
 def main():